@@ -0,0 +1,147 @@
+import heapq
+import itertools
+import math
+import threading
+import time
+
+from data.custom_exceptions import RateLimitExceededError, ServiceOverloadedError
+from data.configs import ADMISSION_GLOBAL_CONCURRENCY, ADMISSION_LIMITS, ADMISSION_DEFAULT_LIMITS, \
+    ADMISSION_RETRY_AFTER_SECONDS, ADMISSION_MAX_TRACKED_USERS
+
+
+class TokenBucket:
+    """Корзина токенов: пополняется со скоростью rate в секунду, вмещает не больше burst."""
+
+    def __init__(self, rate, burst, now):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = now
+
+    def refill(self, now):
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def take(self, now):
+        self.refill(now)
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0
+        return math.ceil((1 - self.tokens) / self.rate)
+
+
+class AdmissionController:
+    """
+        Ограничивает работу, которую сервер берет на себя одновременно.
+
+        Запрос сначала проходит корзину токенов пользователя для своего эндпоинта (иначе 429),
+        затем ждет слот: общий лимит global_concurrency и лимит эндпоинта max_concurrency.
+        Ожидающие запросы упорядочены по priority, поэтому дешевые эндпоинты обслуживаются
+        раньше дорогих. Если очередь эндпоинта заполнена или слот не освободился за timeout
+        секунд, запрос отклоняется с 503.
+        """
+
+    def __init__(self, limits=ADMISSION_LIMITS, default_limits=ADMISSION_DEFAULT_LIMITS,
+                 global_concurrency=ADMISSION_GLOBAL_CONCURRENCY):
+        self.limits = limits
+        self.default_limits = default_limits
+        self.global_concurrency = global_concurrency
+        self.__condition = threading.Condition()
+        self.__active = 0
+        self.__endpoint_active = {}
+        self.__endpoint_queued = {}
+        self.__waiters = []
+        self.__sequence = itertools.count()
+        self.__buckets = {}
+        self.__rejected = {}
+
+    def limits_for(self, endpoint):
+        return {**self.default_limits, **self.limits.get(endpoint, {})}
+
+    def acquire(self, endpoint, user_key):
+        limits = self.limits_for(endpoint)
+        deadline = time.monotonic() + limits['timeout']
+
+        with self.__condition:
+            retry_after = self.__take_token(endpoint, user_key, limits)
+            if retry_after:
+                self.__reject(endpoint)
+                raise RateLimitExceededError(retry_after=retry_after)
+
+            if self.__endpoint_queued.get(endpoint, 0) >= limits['max_queue']:
+                self.__reject(endpoint)
+                raise ServiceOverloadedError(retry_after=ADMISSION_RETRY_AFTER_SECONDS)
+
+            waiter = (limits['priority'], next(self.__sequence), endpoint)
+            heapq.heappush(self.__waiters, waiter)
+            self.__endpoint_queued[endpoint] = self.__endpoint_queued.get(endpoint, 0) + 1
+            try:
+                while self.__next_admitted() != waiter:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self.__reject(endpoint)
+                        raise ServiceOverloadedError(retry_after=ADMISSION_RETRY_AFTER_SECONDS)
+                    self.__condition.wait(remaining)
+            finally:
+                self.__waiters.remove(waiter)
+                heapq.heapify(self.__waiters)
+                self.__endpoint_queued[endpoint] -= 1
+                # Место в очереди освободилось: следующий ожидающий может оказаться первым.
+                self.__condition.notify_all()
+
+            self.__active += 1
+            self.__endpoint_active[endpoint] = self.__endpoint_active.get(endpoint, 0) + 1
+
+    def release(self, endpoint):
+        with self.__condition:
+            self.__active -= 1
+            self.__endpoint_active[endpoint] -= 1
+            self.__condition.notify_all()
+
+    def snapshot(self):
+        with self.__condition:
+            return {
+                'active': self.__active,
+                'global_concurrency': self.global_concurrency,
+                'tracked_users': len(self.__buckets),
+                'endpoints': {
+                    endpoint: {
+                        'active': self.__endpoint_active.get(endpoint, 0),
+                        'queued': self.__endpoint_queued.get(endpoint, 0),
+                        'rejected': self.__rejected.get(endpoint, 0),
+                        'max_concurrency': self.limits_for(endpoint)['max_concurrency'],
+                        'max_queue': self.limits_for(endpoint)['max_queue']
+                    }
+                    for endpoint in sorted(set(self.limits) | set(self.__endpoint_active) | set(self.__rejected))
+                }
+            }
+
+    def __next_admitted(self):
+        if self.__active >= self.global_concurrency:
+            return None
+        # Первый по приоритету ожидающий, у эндпоинта которого есть свободный слот.
+        for waiter in sorted(self.__waiters):
+            endpoint = waiter[2]
+            if self.__endpoint_active.get(endpoint, 0) < self.limits_for(endpoint)['max_concurrency']:
+                return waiter
+        return None
+
+    def __take_token(self, endpoint, user_key, limits):
+        now = time.monotonic()
+        key = (endpoint, user_key)
+        bucket = self.__buckets.get(key)
+        if bucket is None:
+            if len(self.__buckets) >= ADMISSION_MAX_TRACKED_USERS:
+                self.__prune_buckets(now)
+            bucket = self.__buckets[key] = TokenBucket(limits['rate'], limits['burst'], now)
+        return bucket.take(now)
+
+    def __prune_buckets(self, now):
+        # Полностью пополненная корзина ничем не отличается от новой, ее можно забыть.
+        for key, bucket in list(self.__buckets.items()):
+            bucket.refill(now)
+            if bucket.tokens >= bucket.burst:
+                del self.__buckets[key]
+
+    def __reject(self, endpoint):
+        self.__rejected[endpoint] = self.__rejected.get(endpoint, 0) + 1
@@ -0,0 +1,199 @@
+import socket
+import threading
+import time
+from collections import OrderedDict
+
+from data.configs import CACHE_MAX_ENTRIES
+
+
+class InMemoryBackend:
+    """
+        Хранилище в памяти процесса. Подходит, когда приложение запущено одним процессом.
+
+        Записи с TTL лежат в порядке записи: при каждой записи из начала удаляются истекшие,
+        а при превышении max_entries — самые старые. После смены версии старые ключи больше
+        не читаются, поэтому без этого они копились бы бесконечно. Ключи без TTL (счетчики версий)
+        хранятся отдельно и не вытесняются.
+        """
+
+    # Данные видны только текущему процессу.
+    shared = False
+
+    def __init__(self, max_entries=CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self.__data = {}
+        self.__expiring = OrderedDict()
+        self.__lock = threading.Lock()
+
+    def get(self, key):
+        with self.__lock:
+            if key in self.__data:
+                return self.__data[key]
+            item = self.__expiring.get(key)
+            if item is None:
+                return None
+            value, expires_at = item
+            if expires_at <= time.monotonic():
+                del self.__expiring[key]
+                return None
+            return value
+
+    def set(self, key, value, ttl=None):
+        with self.__lock:
+            if ttl:
+                self.__data.pop(key, None)
+                self.__expiring[key] = (value, time.monotonic() + ttl)
+                self.__expiring.move_to_end(key)
+                self.__evict()
+            else:
+                self.__expiring.pop(key, None)
+                self.__data[key] = value
+
+    def incr(self, key):
+        with self.__lock:
+            self.__evict()
+            if key in self.__expiring:
+                value, expires_at = self.__expiring[key]
+                self.__expiring[key] = (str(int(value) + 1), expires_at)
+                return int(value) + 1
+            value = int(self.__data.get(key, '0')) + 1
+            self.__data[key] = str(value)
+            return value
+
+    def delete(self, key):
+        with self.__lock:
+            removed = self.__data.pop(key, None) is not None
+            removed = self.__expiring.pop(key, None) is not None or removed
+            return int(removed)
+
+    def __len__(self):
+        with self.__lock:
+            return len(self.__data) + len(self.__expiring)
+
+    def __evict(self):
+        now = time.monotonic()
+        while self.__expiring:
+            key, (value, expires_at) = next(iter(self.__expiring.items()))
+            if expires_at > now and len(self.__expiring) <= self.max_entries:
+                break
+            del self.__expiring[key]
+
+
+class RedisBackend:
+    """
+        Клиент протокола Redis (RESP) с минимальным набором команд: GET, SET EX, INCR, DEL.
+        Подключается либо по TCP, либо через Unix сокет, поэтому работает как с настоящим Redis,
+        так и с локальным сервером из data/cache/server.py.
+        """
+
+    # Данные видны всем процессам, подключенным к тому же серверу.
+    shared = True
+
+    def __init__(self, host='localhost', port=6379, unix_socket_path=None, timeout=1.0):
+        self.host = host
+        self.port = port
+        self.unix_socket_path = unix_socket_path
+        self.timeout = timeout
+        self.__sock = None
+        self.__file = None
+        self.__lock = threading.Lock()
+
+    def get(self, key):
+        return self.execute('GET', key)
+
+    def set(self, key, value, ttl=None):
+        if ttl:
+            return self.execute('SET', key, value, 'EX', int(ttl))
+        return self.execute('SET', key, value)
+
+    def incr(self, key):
+        return self.execute('INCR', key)
+
+    def delete(self, key):
+        return self.execute('DEL', key)
+
+    def ping(self):
+        return self.execute('PING')
+
+    def execute(self, *args):
+        with self.__lock:
+            try:
+                return self.__execute(args)
+            except OSError:
+                # Соединение могло быть закрыто сервером, пробуем один раз переподключиться.
+                self.close()
+                return self.__execute(args)
+
+    def close(self):
+        if self.__sock is not None:
+            try:
+                self.__sock.close()
+            finally:
+                self.__sock = None
+                self.__file = None
+
+    def __execute(self, args):
+        if self.__sock is None:
+            self.__connect()
+        self.__sock.sendall(encode_command(args))
+        return read_reply(self.__file)
+
+    def __connect(self):
+        if self.unix_socket_path:
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            sock.settimeout(self.timeout)
+            sock.connect(self.unix_socket_path)
+        else:
+            sock = socket.create_connection((self.host, self.port), timeout=self.timeout)
+        self.__sock = sock
+        self.__file = sock.makefile('rb')
+
+
+class RedisError(Exception):
+    """Ошибка, которую вернул сервер в ответ на команду."""
+
+
+def encode_command(args):
+    parts = [b'*%d\r\n' % len(args)]
+    for arg in args:
+        if not isinstance(arg, bytes):
+            arg = str(arg).encode('utf-8')
+        parts.append(b'$%d\r\n%s\r\n' % (len(arg), arg))
+    return b''.join(parts)
+
+
+def encode_reply(value):
+    if value is None:
+        return b'$-1\r\n'
+    if isinstance(value, bool):
+        return b'+OK\r\n' if value else b'-ERR\r\n'
+    if isinstance(value, int):
+        return b':%d\r\n' % value
+    if isinstance(value, RedisError):
+        return b'-%s\r\n' % str(value).encode('utf-8')
+    value = value.encode('utf-8')
+    return b'$%d\r\n%s\r\n' % (len(value), value)
+
+
+def read_reply(file):
+    line = file.readline()
+    if not line:
+        raise ConnectionError('Connection closed by server')
+    prefix, payload = line[:1], line[1:-2]
+    if prefix == b'+':
+        return payload.decode('utf-8')
+    if prefix == b'-':
+        raise RedisError(payload.decode('utf-8'))
+    if prefix == b':':
+        return int(payload)
+    if prefix == b'$':
+        length = int(payload)
+        if length < 0:
+            return None
+        return file.read(length + 2)[:-2].decode('utf-8')
+    if prefix == b'*':
+        length = int(payload)
+        if length < 0:
+            return None
+        return [read_reply(file) for _ in range(length)]
+    raise RedisError(f'Unknown reply type: {line!r}')
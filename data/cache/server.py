@@ -0,0 +1,118 @@
+import fcntl
+import os
+import socket
+import socketserver
+import threading
+
+from data.cache.backends import InMemoryBackend, RedisBackend, RedisError, encode_reply, read_reply
+from data.configs import CACHE_SOCKET_PATH
+
+
+class _CommandHandler(socketserver.StreamRequestHandler):
+
+    def handle(self):
+        while True:
+            try:
+                command = read_reply(self.rfile)
+            except (ConnectionError, RedisError):
+                return
+            self.wfile.write(encode_reply(self.server.dispatch(command)))
+
+
+class LocalCacheServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """
+        Общий кэш для нескольких процессов на одном хосте. Принимает подмножество команд Redis
+        через Unix сокет и хранит данные в InMemoryBackend, поэтому клиентом служит RedisBackend.
+        Этот же сервер можно использовать вместо Redis в тестах.
+        """
+    daemon_threads = True
+
+    def __init__(self, path=CACHE_SOCKET_PATH):
+        self.backend = InMemoryBackend()
+        super().__init__(path, _CommandHandler)
+
+    def dispatch(self, command):
+        if not command:
+            return RedisError('ERR empty command')
+        name, args = command[0].upper(), command[1:]
+        try:
+            if name == 'PING':
+                return True
+            if name == 'GET':
+                return self.backend.get(args[0])
+            if name == 'SET':
+                ttl = int(args[3]) if len(args) == 4 and args[2].upper() == 'EX' else None
+                self.backend.set(args[0], args[1], ttl)
+                return True
+            if name == 'INCR':
+                return self.backend.incr(args[0])
+            if name == 'DEL':
+                return sum(self.backend.delete(key) for key in args)
+        except (IndexError, ValueError):
+            return RedisError(f'ERR wrong arguments for {name}')
+        return RedisError(f'ERR unknown command {name}')
+
+    def server_close(self):
+        super().server_close()
+        if os.path.exists(self.server_address):
+            os.unlink(self.server_address)
+
+
+def serve_in_background(path=CACHE_SOCKET_PATH):
+    """
+        Запускает LocalCacheServer в потоке текущего процесса, если на path еще никто не слушает.
+        Первый запущенный воркер становится сервером, остальные подключаются к нему как клиенты.
+        Если сервер должен пережить воркеры, его можно запустить отдельным процессом:
+        python -m data.cache.server.
+
+        Returns:
+            LocalCacheServer | None: Запущенный сервер или None, если сокет уже обслуживается.
+        """
+    # Проверка и захват сокета идут под блокировкой файла: иначе два воркера, одновременно
+    # увидевшие мертвый сокет, могли бы удалить сокет друг друга и разделить кэш надвое.
+    with open(path + '.lock', 'w') as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        if os.path.exists(path):
+            probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            try:
+                probe.connect(path)
+                return None
+            except ConnectionRefusedError:
+                # Сокет остался от завершившегося процесса.
+                os.unlink(path)
+            finally:
+                probe.close()
+
+        try:
+            server = LocalCacheServer(path)
+        except OSError:
+            return None
+    threading.Thread(target=server.serve_forever, name='cache-server', daemon=True).start()
+    return server
+
+
+class LocalCacheBackend(RedisBackend):
+    """
+        Клиент LocalCacheServer. Сервер живет в одном из воркеров, и после завершения этого воркера
+        сокет перестает отвечать. Тогда клиент сам пробует поднять сервер в своем процессе
+        и повторяет команду, поэтому кэш снова становится общим без перезапуска приложения.
+        """
+
+    def __init__(self, path=CACHE_SOCKET_PATH, timeout=1.0):
+        super().__init__(unix_socket_path=path, timeout=timeout)
+
+    def execute(self, *args):
+        try:
+            return super().execute(*args)
+        except OSError:
+            serve_in_background(self.unix_socket_path)
+            return super().execute(*args)
+
+
+if __name__ == '__main__':
+    with LocalCacheServer() as local_server:
+        print(f"Cache server listening on {CACHE_SOCKET_PATH}")
+        try:
+            local_server.serve_forever()
+        except KeyboardInterrupt:
+            pass
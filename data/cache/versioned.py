@@ -0,0 +1,118 @@
+import json
+import random
+import time
+import threading
+
+from data.cache.backends import InMemoryBackend, RedisBackend, RedisError
+from data.configs import CACHE_BACKEND, CACHE_SOCKET_PATH, CACHE_REDIS_HOST, CACHE_REDIS_PORT, \
+    CACHE_TTL_SECONDS, CACHE_MAX_STALENESS_SECONDS
+
+
+class VersionedCache:
+    """
+        Кэш с версионной инвалидацией. Каждое пространство имен (например, 'notes') имеет счетчик
+        версии в общем хранилище, а ключи записей включают текущую версию. Запись данных
+        увеличивает счетчик, и старые записи перестают читаться, оставаясь истекать по TTL.
+
+        Версия кэшируется в процессе не дольше max_staleness секунд, поэтому чужие изменения
+        становятся видны с задержкой не больше этого значения, а свои — сразу.
+        Читатель получает версию один раз через version() и передает ее и в get, и в set:
+        иначе страница, прочитанная из базы до записи, могла бы сохраниться под новой версией.
+        Ошибки хранилища не прерывают запрос: версия равна None, чтение считается промахом,
+        запись пропускается.
+
+        Отсутствующий счетчик (новое или перезапущенное хранилище) начинается не с нуля, а со
+        случайного значения: иначе процесс с локальной копией версии из прежнего хранилища
+        мог бы принять совпавший по номеру новый счетчик за свой.
+        """
+
+    def __init__(self, backend, ttl=CACHE_TTL_SECONDS, max_staleness=CACHE_MAX_STALENESS_SECONDS):
+        self.backend = backend
+        self.ttl = ttl
+        self.max_staleness = max_staleness
+        self.__versions = {}
+        self.__lock = threading.Lock()
+
+    @property
+    def shared(self):
+        return self.backend.shared
+
+    def version(self, namespace, fresh=False):
+        now = time.monotonic()
+        with self.__lock:
+            cached = self.__versions.get(namespace)
+        # fresh=True читает версию из хранилища в обход локальной копии.
+        if not fresh and cached and now - cached[1] < self.max_staleness:
+            return cached[0]
+
+        try:
+            version = self.backend.get(f'version:{namespace}')
+            version = self.__seed(namespace) if version is None else int(version)
+        except (OSError, RedisError):
+            return None
+        with self.__lock:
+            self.__versions[namespace] = (version, now)
+        return version
+
+    def get(self, namespace, version, key):
+        if version is None:
+            return None
+        try:
+            raw = self.backend.get(f'{namespace}:{version}:{key}')
+        except (OSError, RedisError):
+            return None
+        return None if raw is None else json.loads(raw)
+
+    def set(self, namespace, version, key, value):
+        if version is None:
+            return
+        try:
+            self.backend.set(f'{namespace}:{version}:{key}', json.dumps(value), self.ttl)
+        except (OSError, RedisError):
+            pass
+
+    def invalidate(self, namespace):
+        try:
+            version = self.backend.incr(f'version:{namespace}')
+            if version == 1:
+                # INCR создал отсутствовавший счетчик с нуля.
+                version = self.__seed(namespace)
+        except (OSError, RedisError):
+            # Хранилище недоступно: сбрасываем хотя бы локальную версию.
+            with self.__lock:
+                self.__versions.pop(namespace, None)
+            return
+        with self.__lock:
+            self.__versions[namespace] = (version, time.monotonic())
+
+    def __seed(self, namespace):
+        version = random.getrandbits(62)
+        self.backend.set(f'version:{namespace}', version)
+        return version
+
+
+__cache = None
+
+
+def init_cache(backend=CACHE_BACKEND, socket_path=CACHE_SOCKET_PATH):
+    global __cache
+
+    if backend == 'memory':
+        __cache = VersionedCache(InMemoryBackend())
+    elif backend == 'local':
+        from data.cache.server import LocalCacheBackend, serve_in_background
+        serve_in_background(socket_path)
+        __cache = VersionedCache(LocalCacheBackend(socket_path))
+    elif backend == 'redis':
+        __cache = VersionedCache(RedisBackend(CACHE_REDIS_HOST, CACHE_REDIS_PORT))
+    else:
+        raise ValueError(f"Unknown cache backend: {backend}")
+
+    return __cache
+
+
+def get_cache() -> VersionedCache:
+    global __cache
+    if __cache is None:
+        init_cache()
+    return __cache
@@ -1,7 +1,9 @@
+DATABASE_URL = "sqlite:///mydatabase.db"
+
 MIN_PASSWORD_LENGTH = 5
 MAX_PASSWORD_LENGTH = 20
 
-MAX_TEXT_LENGTH = 200
+MAX_TEXT_LENGTH = 4 * 1024 * 1024
 MAX_TITLE_LENGTH = 50
 
 MIN_TEXT_LENGTH = 1
@@ -10,4 +12,48 @@ MIN_TITLE_LENGTH = 1
 DEFAULT_PAGE = 1
 DEFAULT_PER_PAGE = 10
 
+PREVIEW_LENGTH = 200
+TEXT_COMPRESSION_LEVEL = 6
+TEXT_CHUNK_SIZE = 64 * 1024
+# Худший случай для JSON с ensure_ascii: символ вне BMP кодируется суррогатной парой \uXXXX\uXXXX (12 байт).
+# Запас добавлен на заголовок и остальные поля запроса.
+MAX_CONTENT_LENGTH = MAX_TEXT_LENGTH * 12 + 64 * 1024
+
 SECRET_KEY = "ABOBA"
+
+ARCHIVE_AFTER_DAYS = 30
+ARCHIVE_INTERVAL_SECONDS = 3600
+ARCHIVE_BATCH_SIZE = 500
+# Архивацию выполняет только воркер, удерживающий блокировку этого файла
+ARCHIVE_LOCK_PATH = "/tmp/notes-archiver.lock"
+MIGRATION_BATCH_SIZE = 500
+
+# memory - кэш внутри процесса, local - общий кэш через Unix сокет, redis - внешний Redis
+CACHE_BACKEND = "memory"
+CACHE_SOCKET_PATH = "/tmp/notes-cache.sock"
+CACHE_REDIS_HOST = "localhost"
+CACHE_REDIS_PORT = 6379
+CACHE_TTL_SECONDS = 60
+CACHE_MAX_ENTRIES = 100000
+CACHE_MAX_STALENESS_SECONDS = 1
+
+USERNAME_FILTER_CAPACITY = 100000
+USERNAME_FILTER_ERROR_RATE = 0.01
+
+# Лимиты допуска запросов. priority: чем меньше, тем раньше запрос получает свободный слот.
+# rate и burst задают корзину токенов на пользователя (запросов в секунду и запас).
+ADMISSION_GLOBAL_CONCURRENCY = 16
+ADMISSION_RETRY_AFTER_SECONDS = 1
+ADMISSION_MAX_TRACKED_USERS = 10000
+ADMISSION_DEFAULT_LIMITS = {
+    'max_concurrency': 8, 'max_queue': 16, 'timeout': 2.0, 'priority': 1, 'rate': 10, 'burst': 20
+}
+ADMISSION_LIMITS = {
+    '/register': {'max_concurrency': 2, 'max_queue': 4, 'timeout': 1.0, 'priority': 2, 'rate': 0.2, 'burst': 3},
+    '/login': {'max_concurrency': 4, 'max_queue': 8, 'timeout': 1.0, 'priority': 2, 'rate': 1, 'burst': 5},
+    '/create_note': {'max_concurrency': 8, 'max_queue': 16, 'timeout': 2.0, 'priority': 0, 'rate': 5, 'burst': 10},
+    '/edit_note': {'max_concurrency': 8, 'max_queue': 16, 'timeout': 2.0, 'priority': 0, 'rate': 5, 'burst': 10},
+    '/delete_note': {'max_concurrency': 8, 'max_queue': 16, 'timeout': 2.0, 'priority': 0, 'rate': 5, 'burst': 10},
+    '/get_note': {'max_concurrency': 8, 'max_queue': 16, 'timeout': 2.0, 'priority': 0, 'rate': 10, 'burst': 20},
+    '/show_notes': {'max_concurrency': 4, 'max_queue': 8, 'timeout': 1.5, 'priority': 1, 'rate': 5, 'burst': 10},
+}
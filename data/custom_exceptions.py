@@ -124,3 +124,19 @@ class ThereIsNoData(ValidationError):
 
     def __init__(self, message="there is no any data to get.", status_code=400):
         super().__init__(message, status_code)
+
+
+class RateLimitExceededError(ValidationError):
+    """Exception raised when a user sends requests faster than allowed."""
+
+    def __init__(self, message="Too many requests.", status_code=429, retry_after=1):
+        self.retry_after = retry_after
+        super().__init__(message, status_code)
+
+
+class ServiceOverloadedError(ValidationError):
+    """Exception raised when the server can't take the request in time."""
+
+    def __init__(self, message="Server is overloaded.", status_code=503, retry_after=1):
+        self.retry_after = retry_after
+        super().__init__(message, status_code)
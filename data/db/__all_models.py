@@ -1 +1 @@
-from . import users,notes
+from . import users,notes,archived_notes
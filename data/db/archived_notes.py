@@ -0,0 +1,30 @@
+from sqlalchemy import Column, Integer, String, LargeBinary, ForeignKey, DateTime, Index, func
+from sqlalchemy.orm import deferred
+from data.db.db_session import SqlAlchemyBase
+from data.db.compressed_text import CompressedText
+from data.configs import PREVIEW_LENGTH
+
+
+class ArchivedNote(CompressedText, SqlAlchemyBase):
+    """Холодный уровень хранения: заметки старше ARCHIVE_AFTER_DAYS."""
+    __tablename__ = 'archived_notes'
+    __table_args__ = (
+        Index('ix_archived_notes_user_created', 'user_id', 'created_date'),
+        Index('ix_archived_notes_created', 'created_date'),
+    )
+
+    id = Column(Integer, primary_key=True, autoincrement=False)
+    title = Column(String(255), nullable=False)
+    text_zlib = deferred(Column(LargeBinary, nullable=False))
+    preview = Column(String(PREVIEW_LENGTH), nullable=False)
+    text_length = Column(Integer, nullable=False)
+    user_id = Column(Integer, ForeignKey('users.id'), nullable=False)
+    created_date = Column(DateTime, nullable=False)
+    updated_date = Column(DateTime, nullable=False, onupdate=func.current_timestamp())
+    archived_date = Column(DateTime, default=func.current_timestamp())
+
+    @classmethod
+    def from_note(cls, note):
+        return cls(id=note.id, title=note.title, text_zlib=note.text_zlib, preview=note.preview,
+                   text_length=note.text_length, user_id=note.user_id,
+                   created_date=note.created_date, updated_date=note.updated_date)
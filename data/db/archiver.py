@@ -0,0 +1,64 @@
+import fcntl
+import threading
+
+from data.db.db_session import create_session
+from data.db.func import archive_old_notes
+from data.configs import ARCHIVE_INTERVAL_SECONDS, ARCHIVE_LOCK_PATH
+
+__stop_event = threading.Event()
+
+
+def start_archiver(interval=ARCHIVE_INTERVAL_SECONDS, lock_path=ARCHIVE_LOCK_PATH):
+    """
+        Запускает фоновый поток, который раз в interval секунд переносит старые заметки
+        из горячей таблицы notes в сжатый архив archived_notes.
+        Поток использует собственную сессию, чтобы не делить её с обработчиками запросов.
+
+        Поток запускается в каждом воркере, но архивирует только тот, кто удерживает блокировку
+        файла lock_path. Остальные на каждом проходе пробуют ее занять и подхватывают работу,
+        если воркер-архиватор завершился.
+
+        Args:
+            interval (int): Период запуска архивации в секундах.
+            lock_path (str): Файл блокировки, общий для воркеров одного развертывания.
+
+        Returns:
+            threading.Thread: Запущенный поток-демон.
+        """
+
+    def run():
+        with open(lock_path, 'w') as lock_file:
+            while not __stop_event.is_set():
+                if holds_lock(lock_file):
+                    archive()
+                __stop_event.wait(interval)
+
+    def archive():
+        session = create_session()
+        try:
+            archived = archive_old_notes(session)
+            if archived:
+                print(f"Archived {archived} notes")
+        except Exception as e:
+            session.rollback()
+            print(f"Archivation failed: {e}")
+        finally:
+            session.close()
+
+    __stop_event.clear()
+    thread = threading.Thread(target=run, name='notes-archiver', daemon=True)
+    thread.start()
+    return thread
+
+
+def stop_archiver():
+    __stop_event.set()
+
+
+def holds_lock(lock_file):
+    # Повторный flock на уже удерживаемой блокировке просто успешно возвращается.
+    try:
+        fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        return False
+    return True
@@ -0,0 +1,43 @@
+import codecs
+import zlib
+
+from data.configs import TEXT_COMPRESSION_LEVEL, PREVIEW_LENGTH, TEXT_CHUNK_SIZE
+
+
+class CompressedText:
+    """
+        Примесь для моделей, хранящих текст заметки в сжатом виде.
+        Модель должна объявить колонки text_zlib (отложенная загрузка), preview и text_length.
+        Присваивание text сжимает тело и заново считает превью и длину.
+        """
+
+    @property
+    def text(self):
+        return zlib.decompress(self.text_zlib).decode('utf-8')
+
+    @text.setter
+    def text(self, value):
+        for name, column_value in pack_text(value).items():
+            setattr(self, name, column_value)
+
+    def iter_text(self, chunk_size=TEXT_CHUNK_SIZE):
+        decompressor = zlib.decompressobj()
+        decoder = codecs.getincrementaldecoder('utf-8')()
+        data = self.text_zlib
+        for start in range(0, len(data), chunk_size):
+            chunk = decoder.decode(decompressor.decompress(data[start:start + chunk_size]))
+            if chunk:
+                yield chunk
+        tail = decoder.decode(decompressor.flush(), final=True)
+        if tail:
+            yield tail
+
+
+
+def pack_text(value):
+    """Значения колонок text_zlib, preview и text_length для текста value."""
+    return {
+        'text_zlib': zlib.compress(value.encode('utf-8'), TEXT_COMPRESSION_LEVEL),
+        'preview': value[:PREVIEW_LENGTH],
+        'text_length': len(value)
+    }
@@ -1,14 +1,15 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, inspect, text, DateTime
 from sqlalchemy.engine.url import URL
 from sqlalchemy.orm import sessionmaker, Session
 from sqlalchemy.ext.declarative import declarative_base
+from data.configs import DATABASE_URL, MIGRATION_BATCH_SIZE
 
 SqlAlchemyBase = declarative_base()
 
 __factory = None
 
 
-def global_init():
+def global_init(db_url=DATABASE_URL):
     global __factory
 
     if __factory:
@@ -16,14 +17,63 @@ def global_init():
 
     print(f"Connecting to database")
 
-    engine = create_engine('sqlite:///mydatabase.db')  # изменено с create_engine(URL(**DATABASE))
+    engine = create_engine(db_url)  # изменено с create_engine(URL(**DATABASE))
     __factory = sessionmaker(bind=engine)
 
     from . import __all_models
 
+    upgrade_schema(engine)
     SqlAlchemyBase.metadata.create_all(engine)
+    # create_all не трогает существующие таблицы, поэтому новые индексы создаются отдельно.
+    for table in SqlAlchemyBase.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(engine, checkfirst=True)
 
 
 def create_session() -> Session:
     global __factory
-    return __factory()
\ No newline at end of file
+    return __factory()
+
+
+def upgrade_schema(engine):
+    """
+        Переводит таблицу notes из старого формата (колонка text) в текущий: сжатое тело text_zlib,
+        превью и длина текста. Таблица пересоздается целиком, чтобы получить ограничения
+        и индексы модели Note, после чего строки переносятся пачками по MIGRATION_BATCH_SIZE.
+        """
+    from .notes import Note
+    from .compressed_text import pack_text
+
+    inspector = inspect(engine)
+    if not inspector.has_table('notes'):
+        return
+    if 'text' not in {column['name'] for column in inspector.get_columns('notes')}:
+        return
+
+    print("Upgrading notes table")
+
+    with engine.begin() as conn:
+        conn.execute(text("ALTER TABLE notes RENAME TO notes_legacy"))
+        Note.__table__.create(conn)
+
+        last_id = 0
+        while True:
+            rows = conn.execute(text(
+                "SELECT id, title, text, user_id, created_date, updated_date FROM notes_legacy "
+                "WHERE id > :last_id ORDER BY id LIMIT :limit"
+            ).columns(created_date=DateTime, updated_date=DateTime), {'last_id': last_id, 'limit': MIGRATION_BATCH_SIZE}).mappings().all()
+            if not rows:
+                break
+            conn.execute(Note.__table__.insert(), [{
+                'id': row['id'],
+                'title': row['title'],
+                'user_id': row['user_id'],
+                'created_date': row['created_date'],
+                'updated_date': row['updated_date'],
+                **pack_text(row['text'])
+            } for row in rows])
+            last_id = rows[-1]['id']
+
+        conn.execute(text("DROP TABLE notes_legacy"))
+        if engine.dialect.name == 'postgresql':
+            conn.execute(text("SELECT setval(pg_get_serial_sequence('notes', 'id'), COALESCE(MAX(id), 1)) FROM notes"))
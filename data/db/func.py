@@ -1,11 +1,18 @@
 from werkzeug.security import generate_password_hash, check_password_hash
-from sqlalchemy import or_, desc
+from sqlalchemy import and_, desc, func
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import undefer
 import jwt
 from data.db.users import User
 from data.db.notes import Note
+from data.db.archived_notes import ArchivedNote
+from data.db.compressed_text import pack_text
+from data.db.username_filter import username_might_exist, add_username
+from data.cache.versioned import get_cache
 from data.custom_exceptions import *
 from data.configs import *
 import re
+import json
 import datetime
 
 
@@ -19,13 +26,16 @@ def register_user(session, username, password):
     if not is_password_correct(password):
         raise InvalidPasswordError("Password is invalid")
 
-    if is_user_exists(session, username):
-        raise UserAlreadyExistsError("User already exists")
-
+    # Уникальность имени проверяет индекс базы: отдельный запрос перед вставкой не защищает от гонки.
     hashed_password = generate_password_hash(password, method='pbkdf2:sha256')
     new_user = User(username=username, password_hash=hashed_password)
     session.add(new_user)
-    session.commit()
+    try:
+        session.commit()
+    except IntegrityError:
+        session.rollback()
+        raise UserAlreadyExistsError("User already exists")
+    add_username(username)
 
     return {
         "message": "User successfully registered",
@@ -43,15 +53,18 @@ def login_user(session, username, password):
     if not is_password_correct(password):
         raise InvalidPasswordError("Password is invalid")
 
-    if not is_user_exists(session, username):
+    if not username_might_exist(session, username):
         raise UserDoesNotExistsError()
 
-    validation_res = is_password_matched(session, username, password)
-    if not validation_res:
+    user = session.query(User.id, User.password_hash).filter_by(username=username).first()
+    if not user:
+        raise UserDoesNotExistsError()
+
+    if not check_password_hash(user.password_hash, password):
         raise IncorrectPasswordError()
 
     token = jwt.encode({
-        'user_id': validation_res,
+        'user_id': user.id,
         'exp': datetime.datetime.utcnow() + datetime.timedelta(hours=24)
     }, SECRET_KEY, algorithm='HS256')
 
@@ -62,6 +75,22 @@ def login_user(session, username, password):
     }
 
 
+def get_user(session, user_id):
+    # Запись пользователя нужна каждому запросу с токеном. Пользователи не меняются и не удаляются,
+    # поэтому запись кэшируется без инвалидации и живет до истечения TTL.
+    # Отсутствие пользователя не кэшируется: такой id еще может появиться.
+    cache = get_cache()
+    cache_version = cache.version('user_records')
+    user = cache.get('user_records', cache_version, user_id)
+    if user is None:
+        row = session.query(User.id, User.username).filter_by(id=user_id).first()
+        if not row:
+            return None
+        user = {'id': row.id, 'username': row.username}
+        cache.set('user_records', cache_version, user_id, user)
+    return user
+
+
 def create_note(session, user_id, title, text):
     if (not title) or (not text):
         raise NoneNoteParamsError()
@@ -74,15 +103,21 @@ def create_note(session, user_id, title, text):
 
     new_note = Note(user_id=user_id, title=title, text=text)
     session.add(new_note)
-    session.commit()
+    session.flush()
 
-    return {
+    # Ответ собирается до commit: после него объект истекает и чтение полей стоило бы лишнего SELECT.
+    result = {
         "message": "Note created successfully",
         "note_id": new_note.id,
         "title": new_note.title,
-        "text": new_note.text,
+        "preview": new_note.preview,
+        "text_length": new_note.text_length,
         "status": True
     }
+    session.commit()
+    get_cache().invalidate('notes')
+
+    return result
 
 
 def edit_note(session, note_id, title, text, token):
@@ -95,7 +130,7 @@ def edit_note(session, note_id, title, text, token):
     if not is_text_correct(text):
         raise InvalidTextError()
 
-    note = session.query(Note).filter(Note.id == note_id).first()
+    note = find_note(session, note_id)
 
     if not note:
         raise NoteDoesNotExistsError()
@@ -111,35 +146,38 @@ def edit_note(session, note_id, title, text, token):
     if not title and not text:
         raise NoneNoteParamsError()
 
-    if not title:
-        new_title = note.title
-    else:
-        new_title = title
-    if not text:
-        new_text = note.text
-    else:
-        new_text = text
-
-    session.query(Note).filter(Note.id == note_id).update({
-        Note.title: new_title,
-        Note.text: new_text
-    })
-    session.commit()
+    values = {}
+    if title:
+        values['title'] = title
+    # Тело хранится сжатым, поэтому его не трогаем, если новый текст не передан.
+    if text:
+        values.update(pack_text(text))
+
+    # Архиватор может перенести заметку между find_note и записью, поэтому обновление
+    # ограничено уровнем, а при промахе повторяется в другом уровне.
+    if not update_note_in_tiers(session, note, values):
+        session.rollback()
+        raise NoteDoesNotExistsError()
 
-    return {
+    result = {
         "message": "Note edited successfully",
         "note_id": note.id,
-        "title": note.title,
-        "text": note.text,
+        "title": values.get('title', note.title),
+        "preview": values.get('preview', note.preview),
+        "text_length": values.get('text_length', note.text_length),
         "status": True
     }
+    session.commit()
+    get_cache().invalidate('notes')
+
+    return result
 
 
 def delete_note(session, note_id, token):
     if not is_note_id_correct(note_id):
         raise InvalidNoteID()
 
-    note = session.query(Note).filter(Note.id == note_id).first()
+    note = find_note(session, note_id)
 
     if not note:
         raise NoteDoesNotExistsError()
@@ -149,14 +187,40 @@ def delete_note(session, note_id, token):
     if not (note.user_id == data['user_id']):
         raise AccessDeniedError()
 
-    session.delete(note)
+    result = {
+        "message": "Note deleted successfully",
+        "note_id": note.id,
+        "title": note.title,
+        "preview": note.preview,
+        "text_length": note.text_length,
+        "status": True
+    }
+
+    if not delete_note_in_tiers(session, note):
+        session.rollback()
+        raise NoteDoesNotExistsError()
     session.commit()
+    get_cache().invalidate('notes')
+
+    return result
+
+
+def get_note(session, note_id):
+    if not is_note_id_correct(note_id):
+        raise InvalidNoteID()
+
+    note = find_note(session, note_id, with_text=True)
+
+    if not note:
+        raise NoteDoesNotExistsError()
 
     return {
-        "message": "Note deleted successfully",
         "note_id": note.id,
         "title": note.title,
-        "text": note.text,
+        "user_id": note.user_id,
+        "created_at": note.created_date.isoformat(),
+        "text_length": note.text_length,
+        "text": note.iter_text(),
         "status": True
     }
 
@@ -167,8 +231,6 @@ def show_notes(session, start_date, end_date, page, per_page, user_id, token):
     if not per_page:
         per_page = DEFAULT_PER_PAGE
 
-    conditions = []
-
     if page < 1 or per_page < 1:
         raise InvalidPageParamsError()
 
@@ -177,60 +239,145 @@ def show_notes(session, start_date, end_date, page, per_page, user_id, token):
     if start_date and end_date and start_date > end_date:
         raise InvalidDateGapError()
 
-    if start_date and is_valid_date_format(start_date):
-        conditions.append(Note.created_date >= start_date)
-    if end_date and is_valid_date_format(end_date):
-        conditions.append(Note.created_date <= end_date)
-    if user_id:
-        conditions.append(Note.user_id == user_id)
-
-    if conditions:
-        result = session.query(Note).filter(or_(*conditions))  ######check
-    else:
-        result = session.query(Note)
-
-    if start_index >= result.count():
-        raise ThereIsNoData()
-
-    notes_query = result.order_by(desc(Note.created_date))
-    total_notes = notes_query.count()
-    notes = notes_query.offset(start_index).limit(per_page).all()
+    # Результат зависит только от параметров запроса, поэтому кэшируется до следующего изменения заметок.
+    # Версия читается до запроса к базе: если заметки изменятся во время чтения,
+    # страница сохранится под старой версией и не будет видна после инвалидации.
+    cache = get_cache()
+    cache_version = cache.version('notes')
+    cache_key = json.dumps([start_date, end_date, page, per_page, user_id])
+    page_data = cache.get('notes', cache_version, cache_key)
+    if page_data is None:
+        page_data = load_notes_page(session, start_date, end_date, start_index, per_page, user_id)
+        cache.set('notes', cache_version, cache_key, page_data)
 
     try:
         data = jwt.decode(token, SECRET_KEY, algorithms=["HS256"])
     except jwt.exceptions.InvalidSignatureError as e:
         data = None
 
-    notes_data = [{
-        'id': note.id,
-        'title': note.title,
-        'text': note.text,
-        'user_id': note.user_id,
-        'created_at': note.created_date.isoformat(),
-        'is_you_owner': ((note.user_id == data['user_id']) if data else False)
-    } for note in notes]
+    notes_data = [dict(note, is_you_owner=((note['user_id'] == data['user_id']) if data else False))
+                  for note in page_data['notes']]
 
     return {
         'notes': notes_data,
-        'total': total_notes,
+        'total': page_data['total'],
         'page': page,
         'per_page': per_page
     }
 
 
+def archive_old_notes(session, max_age_days=ARCHIVE_AFTER_DAYS, batch_size=ARCHIVE_BATCH_SIZE):
+    cutoff = datetime.datetime.now() - datetime.timedelta(days=max_age_days)
+    archived = 0
+    last_id = 0
+
+    while True:
+        # with_for_update() блокирует строки до commit там, где база это умеет (PostgreSQL).
+        # SQLite блокировку строк не поддерживает, поэтому удаление дополнительно условно:
+        # заметка, измененная после выборки, остается в горячей таблице до следующего прохода.
+        notes = session.query(Note).options(undefer(Note.text_zlib)) \
+            .filter(Note.created_date < cutoff, Note.id > last_id) \
+            .order_by(Note.id).limit(batch_size).with_for_update().all()
+        if not notes:
+            break
+
+        for note in notes:
+            deleted = session.query(Note).filter(Note.id == note.id, Note.updated_date == note.updated_date) \
+                .delete(synchronize_session=False)
+            if deleted:
+                session.add(ArchivedNote.from_note(note))
+                archived += 1
+        last_id = notes[-1].id
+        session.commit()
+
+    return archived
+
+
 # ----------------------------------------------------------------------------------------------------------------------
-def is_user_exists(session, username):
-    exists = session.query(User.username).filter_by(username=username).first() is not None
-    return exists
+def find_note(session, note_id, with_text=False):
+    if note_id is None:
+        return None
+    note = session.get(Note, note_id, options=[undefer(Note.text_zlib)] if with_text else None)
+    if note is None:
+        note = session.get(ArchivedNote, note_id, options=[undefer(ArchivedNote.text_zlib)] if with_text else None)
+    return note
 
 
-def is_password_matched(session, username, password):
-    user = session.query(User).filter_by(username=username).first()
+def note_tiers(note):
+    # Сначала уровень, из которого заметка была прочитана, затем другой.
+    return (ArchivedNote, Note) if isinstance(note, ArchivedNote) else (Note, ArchivedNote)
 
-    if not check_password_hash(user.password_hash, password):
-        return False
 
-    return user.id
+def update_note_in_tiers(session, note, values):
+    for model in note_tiers(note):
+        updated = session.query(model).filter(model.id == note.id, model.user_id == note.user_id) \
+            .update(values, synchronize_session=False)
+        if updated:
+            return True
+    return False
+
+
+def delete_note_in_tiers(session, note):
+    for model in note_tiers(note):
+        deleted = session.query(model).filter(model.id == note.id, model.user_id == note.user_id) \
+            .delete(synchronize_session=False)
+        if deleted:
+            return True
+    return False
+
+
+def load_notes_page(session, start_date, end_date, start_index, per_page, user_id):
+    # Горячая таблица отсортирована по убыванию даты и целиком новее архива,
+    # поэтому страница, выходящая за её пределы, дочитывается из холодного уровня.
+    hot_query = filter_notes(session.query(Note), Note, start_date, end_date, user_id)
+    cold_query = filter_notes(session.query(ArchivedNote), ArchivedNote, start_date, end_date, user_id)
+
+    # count() через Query оборачивает запрос в подзапрос со всеми колонками; считаем по id напрямую.
+    hot_total = hot_query.with_entities(func.count(Note.id)).scalar()
+    total_notes = hot_total + cold_query.with_entities(func.count(ArchivedNote.id)).scalar()
+
+    if start_index >= total_notes:
+        raise ThereIsNoData()
+
+    notes = []
+    if start_index < hot_total:
+        notes = hot_query.order_by(desc(Note.created_date)).offset(start_index).limit(per_page).all()
+    if len(notes) < per_page and total_notes > hot_total:
+        notes += cold_query.order_by(desc(ArchivedNote.created_date)) \
+            .offset(max(start_index - hot_total, 0)).limit(per_page - len(notes)).all()
+
+    return {
+        'notes': [{
+            'id': note.id,
+            'title': note.title,
+            'preview': note.preview,
+            'text_length': note.text_length,
+            'user_id': note.user_id,
+            'created_at': note.created_date.isoformat()
+        } for note in notes],
+        'total': total_notes
+    }
+
+
+def filter_notes(query, model, start_date, end_date, user_id):
+    conditions = []
+
+    # Даты приходят как YYYY.MM.DD, а хранятся как DATETIME: сравнивать их как строки нельзя.
+    # end_date включает весь указанный день.
+    start = parse_date(start_date)
+    if start:
+        conditions.append(model.created_date >= start)
+    end = parse_date(end_date)
+    if end:
+        conditions.append(model.created_date < end + datetime.timedelta(days=1))
+    if user_id:
+        conditions.append(model.user_id == user_id)
+
+    # Фильтры сужают выборку вместе: с or_ диапазон дат совпадал со всеми строками,
+    # а объединение условий по разным колонкам не обслуживается одним индексом.
+    if conditions:
+        return query.filter(and_(*conditions))
+    return query
 
 
 def is_note_id_correct(note_id):
@@ -289,3 +436,12 @@ def is_valid_date_format(date_string):
         return False
     pattern = r'^\d{4}\.\d{2}\.\d{2}$'
     return bool(re.match(pattern, date_string))
+
+
+def parse_date(date_string):
+    if not date_string or not is_valid_date_format(date_string):
+        return None
+    try:
+        return datetime.datetime.strptime(date_string, '%Y.%m.%d')
+    except ValueError:
+        return None
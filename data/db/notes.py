@@ -1,13 +1,23 @@
-from sqlalchemy import Column, Integer, String, Text,ForeignKey,DateTime,func
+from sqlalchemy import Column, Integer, String, LargeBinary, ForeignKey, DateTime, Index, func
+from sqlalchemy.orm import deferred
 from data.db.db_session import SqlAlchemyBase
+from data.db.compressed_text import CompressedText
+from data.configs import PREVIEW_LENGTH
 
 
-class Note(SqlAlchemyBase):
+class Note(CompressedText, SqlAlchemyBase):
     __tablename__ = 'notes'
+    __table_args__ = (
+        Index('ix_notes_user_created', 'user_id', 'created_date'),
+        Index('ix_notes_created', 'created_date'),
+        {'sqlite_autoincrement': True},
+    )
 
     id = Column(Integer, primary_key=True)
     title = Column(String(255), nullable=False)
-    text = Column(Text, nullable=False)
+    text_zlib = deferred(Column(LargeBinary, nullable=False))
+    preview = Column(String(PREVIEW_LENGTH), nullable=False)
+    text_length = Column(Integer, nullable=False)
     user_id = Column(Integer, ForeignKey('users.id'), nullable=False)
     created_date = Column(DateTime, default=func.current_timestamp())
     updated_date = Column(DateTime, default=func.current_timestamp(), onupdate=func.current_timestamp())
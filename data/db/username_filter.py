@@ -0,0 +1,82 @@
+import threading
+
+from data.db.users import User
+from data.cache.bloom import BloomFilter
+from data.cache.backends import RedisError
+from data.cache.versioned import get_cache
+from data.configs import USERNAME_FILTER_CAPACITY, USERNAME_FILTER_ERROR_RATE
+
+__filter = None
+__version = None
+__lock = threading.Lock()
+
+
+def init_username_filter(session):
+    """
+        Строит Bloom фильтр имен всех пользователей. Вызывается при старте приложения.
+        """
+    with __lock:
+        rebuild(session, users_version(fresh=True))
+
+
+def username_might_exist(session, username):
+    """
+        Возвращает False, только если пользователя с таким именем точно нет, не обращаясь к базе.
+
+        Регистрации в других воркерах видны только через версию 'users' в общем кэше, поэтому
+        промаху фильтра можно верить лишь при общем хранилище. При смене версии фильтр
+        пересобирается целиком: догрузка по id > последнего пропускала бы пользователей,
+        чьи транзакции с меньшим id завершились позже.
+        """
+    if __filter is None:
+        init_username_filter(session)
+
+    if username in __filter:
+        return True
+
+    # Кэш в памяти процесса не знает о регистрациях в других воркерах: решает база.
+    if not get_cache().shared:
+        return True
+
+    # Локальная копия версии может отставать, а Bloom фильтр не должен давать ложных отрицаний:
+    # при промахе версия читается прямо из общего хранилища.
+    version = users_version(fresh=True)
+    if version is None:
+        # Общий кэш недоступен, и отсутствие имени нельзя гарантировать: решает база.
+        return True
+    if version == __version:
+        return False
+
+    with __lock:
+        if version != __version:
+            rebuild(session, version)
+    return username in __filter
+
+
+def add_username(username):
+    if __filter is None:
+        return
+    with __lock:
+        __filter.add(username)
+    try:
+        get_cache().invalidate('users')
+    except (OSError, RedisError):
+        pass
+
+
+def rebuild(session, version):
+    global __filter, __version
+
+    # Версия прочитана до выборки: регистрация после нее сменит версию и вызовет новую пересборку.
+    usernames = [username for username, in session.query(User.username)]
+    new_filter = BloomFilter(max(USERNAME_FILTER_CAPACITY, len(usernames) * 2), USERNAME_FILTER_ERROR_RATE)
+    for username in usernames:
+        new_filter.add(username)
+    __filter, __version = new_filter, version
+
+
+def users_version(fresh=False):
+    try:
+        return get_cache().version('users', fresh)
+    except (OSError, RedisError):
+        return None
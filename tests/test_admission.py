@@ -0,0 +1,157 @@
+"""
+    Проверка AdmissionController: корзин токенов (429), очередей и таймаутов (503),
+    порядка допуска по приоритету, независимости эндпоинтов и снимка состояния.
+
+    Ожидающие запросы запускаются в потоках; тест дожидается, пока они встанут в очередь,
+    по snapshot(), а не по фиксированным паузам.
+"""
+import threading
+import time
+
+import pytest
+
+from data.admission import AdmissionController
+from data.custom_exceptions import RateLimitExceededError, ServiceOverloadedError
+
+LIMITS = {'max_concurrency': 1, 'max_queue': 4, 'timeout': 5.0, 'priority': 1, 'rate': 1000, 'burst': 1000}
+
+
+def make_controller(limits=None, global_concurrency=16):
+    return AdmissionController(limits=limits or {}, default_limits=LIMITS, global_concurrency=global_concurrency)
+
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, 'condition was not met in time'
+        time.sleep(0.01)
+
+
+def queued(controller, endpoint):
+    return controller.snapshot()['endpoints'].get(endpoint, {}).get('queued', 0)
+
+
+def start_waiter(controller, endpoint, user_key, admitted):
+    def run():
+        try:
+            controller.acquire(endpoint, user_key)
+        except ServiceOverloadedError as e:
+            admitted.append((endpoint, e))
+            return
+        admitted.append(endpoint)
+        controller.release(endpoint)
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    return thread
+
+
+def test_burst_exhaustion_returns_429_with_retry_after():
+    controller = make_controller({'/login': {'rate': 0.5, 'burst': 2}})
+
+    for _ in range(2):
+        controller.acquire('/login', 'alice')
+        controller.release('/login')
+
+    with pytest.raises(RateLimitExceededError) as error:
+        controller.acquire('/login', 'alice')
+    assert error.value.status_code == 429
+    assert error.value.retry_after == 2
+
+    # Корзины у пользователей раздельные.
+    controller.acquire('/login', 'bob')
+    controller.release('/login')
+
+
+def test_full_queue_returns_503():
+    controller = make_controller({'/show_notes': {'max_queue': 1}})
+    controller.acquire('/show_notes', 'holder')
+    admitted = []
+    waiter = start_waiter(controller, '/show_notes', 'first', admitted)
+    wait_for(lambda: queued(controller, '/show_notes') == 1)
+
+    with pytest.raises(ServiceOverloadedError) as error:
+        controller.acquire('/show_notes', 'second')
+    assert error.value.status_code == 503
+    assert error.value.retry_after > 0
+
+    controller.release('/show_notes')
+    waiter.join(5)
+    assert admitted == ['/show_notes']
+
+
+def test_waiter_past_deadline_returns_503():
+    controller = make_controller({'/show_notes': {'timeout': 0.2}})
+    controller.acquire('/show_notes', 'holder')
+
+    started = time.monotonic()
+    with pytest.raises(ServiceOverloadedError):
+        controller.acquire('/show_notes', 'waiter')
+    assert 0.2 <= time.monotonic() - started < 2
+
+    assert queued(controller, '/show_notes') == 0
+    controller.release('/show_notes')
+
+
+def test_higher_priority_waiter_is_admitted_first():
+    controller = make_controller({'/create_note': {'priority': 0}, '/show_notes': {'priority': 2}},
+                                 global_concurrency=1)
+    controller.acquire('/login', 'holder')
+    admitted = []
+
+    # Дорогой эндпоинт встает в очередь раньше, но дешевый допускается первым.
+    waiters = [start_waiter(controller, '/show_notes', 'reader', admitted)]
+    wait_for(lambda: queued(controller, '/show_notes') == 1)
+    waiters.append(start_waiter(controller, '/create_note', 'writer', admitted))
+    wait_for(lambda: queued(controller, '/create_note') == 1)
+
+    controller.release('/login')
+    for waiter in waiters:
+        waiter.join(5)
+    assert admitted == ['/create_note', '/show_notes']
+
+
+def test_full_endpoint_does_not_block_other_endpoints():
+    controller = make_controller({'/show_notes': {'priority': 0}, '/login': {'priority': 2}})
+    controller.acquire('/show_notes', 'holder')
+    admitted = []
+    waiter = start_waiter(controller, '/show_notes', 'reader', admitted)
+    wait_for(lambda: queued(controller, '/show_notes') == 1)
+
+    # Ожидающий с более высоким приоритетом стоит за занятым эндпоинтом и не мешает другим.
+    controller.acquire('/login', 'alice')
+    controller.release('/login')
+
+    controller.release('/show_notes')
+    waiter.join(5)
+    assert admitted == ['/show_notes']
+
+
+def test_snapshot_counts_active_queued_and_rejected():
+    controller = make_controller({'/show_notes': {'max_queue': 1}, '/login': {'rate': 0.1, 'burst': 1}})
+    controller.acquire('/show_notes', 'holder')
+    admitted = []
+    waiter = start_waiter(controller, '/show_notes', 'reader', admitted)
+    wait_for(lambda: queued(controller, '/show_notes') == 1)
+    with pytest.raises(ServiceOverloadedError):
+        controller.acquire('/show_notes', 'extra')
+    controller.acquire('/login', 'alice')
+    controller.release('/login')
+    with pytest.raises(RateLimitExceededError):
+        controller.acquire('/login', 'alice')
+
+    snapshot = controller.snapshot()
+    assert snapshot['active'] == 1
+    assert snapshot['global_concurrency'] == 16
+    assert snapshot['tracked_users'] == 4
+    assert snapshot['endpoints']['/show_notes'] == {
+        'active': 1, 'queued': 1, 'rejected': 1, 'max_concurrency': 1, 'max_queue': 1
+    }
+    assert snapshot['endpoints']['/login']['active'] == 0
+    assert snapshot['endpoints']['/login']['rejected'] == 1
+
+    controller.release('/show_notes')
+    waiter.join(5)
+    snapshot = controller.snapshot()
+    assert snapshot['active'] == 0
+    assert snapshot['endpoints']['/show_notes']['queued'] == 0
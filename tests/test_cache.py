@@ -0,0 +1,113 @@
+"""
+    Проверка версионного кэша поверх локального сервера кэша.
+
+    Сервер запускается через serve_in_background на временном Unix сокете, клиенты подключаются
+    к нему так же, как воркеры приложения: через LocalCacheBackend.
+"""
+import tempfile
+import time
+
+import pytest
+
+from data.cache.backends import RedisBackend
+from data.cache.server import LocalCacheBackend, serve_in_background
+from data.cache.versioned import VersionedCache
+
+
+@pytest.fixture
+def socket_path():
+    # Путь Unix сокета ограничен ~100 символами, поэтому каталог берется короткий.
+    path = f"{tempfile.mkdtemp(prefix='cache')}/cache.sock"
+    server = serve_in_background(path)
+    yield path
+    server.shutdown()
+    server.server_close()
+
+
+def test_set_get_and_delete(socket_path):
+    backend = LocalCacheBackend(socket_path)
+
+    assert backend.get('missing') is None
+    backend.set('key', 'value')
+    assert backend.get('key') == 'value'
+    assert backend.delete('key') == 1
+    assert backend.get('key') is None
+
+
+def test_entries_expire_after_ttl(socket_path):
+    backend = LocalCacheBackend(socket_path)
+
+    backend.set('short', 'value', ttl=1)
+    backend.set('long', 'value', ttl=60)
+    assert backend.get('short') == 'value'
+    time.sleep(1.1)
+    assert backend.get('short') is None
+    assert backend.get('long') == 'value'
+
+
+def test_invalidate_hides_entries_of_old_version(socket_path):
+    writer = VersionedCache(LocalCacheBackend(socket_path))
+    reader = VersionedCache(LocalCacheBackend(socket_path))
+
+    version = writer.version('notes')
+    writer.set('notes', version, 'page', {'total': 1})
+    assert reader.get('notes', reader.version('notes'), 'page') == {'total': 1}
+
+    writer.invalidate('notes')
+
+    # Свои изменения видны сразу, чужие — при чтении версии в обход локальной копии.
+    assert writer.version('notes') == version + 1
+    new_version = reader.version('notes', fresh=True)
+    assert new_version == version + 1
+    assert reader.get('notes', new_version, 'page') is None
+    # Старая запись не удаляется, а просто перестает читаться и истекает по TTL.
+    assert reader.get('notes', version, 'page') == {'total': 1}
+
+
+def test_local_version_copy_is_stale_for_max_staleness(socket_path):
+    writer = VersionedCache(LocalCacheBackend(socket_path))
+    reader = VersionedCache(LocalCacheBackend(socket_path), max_staleness=60)
+
+    version = reader.version('notes')
+    writer.invalidate('notes')
+
+    assert reader.version('notes') == version
+    assert reader.version('notes', fresh=True) == version + 1
+
+
+def test_namespaces_are_invalidated_separately(socket_path):
+    cache = VersionedCache(LocalCacheBackend(socket_path))
+
+    users_version = cache.version('users')
+    cache.invalidate('notes')
+
+    assert cache.version('users', fresh=True) == users_version
+
+
+def test_unavailable_backend_degrades_to_misses(tmp_path):
+    cache = VersionedCache(RedisBackend(unix_socket_path=str(tmp_path / 'missing.sock')))
+
+    version = cache.version('notes')
+    assert version is None
+    assert cache.get('notes', version, 'page') is None
+    cache.set('notes', version, 'page', {'total': 1})
+    cache.invalidate('notes')
+
+
+def test_client_rehosts_server_after_it_stops():
+    path = f"{tempfile.mkdtemp(prefix='cache')}/cache.sock"
+    server = serve_in_background(path)
+    cache = VersionedCache(LocalCacheBackend(path))
+    old_version = cache.version('notes')
+
+    # Завершение воркера с сервером: сокет удален, открытые соединения разорваны.
+    server.shutdown()
+    server.server_close()
+    cache.backend.close()
+
+    # Новый сервер пуст, но счетчик начинается не с нуля и не совпадает со старой версией.
+    new_version = cache.version('notes', fresh=True)
+    assert new_version is not None
+    assert new_version != old_version
+    cache.set('notes', new_version, 'page', {'total': 2})
+    assert cache.get('notes', new_version, 'page') == {'total': 2}
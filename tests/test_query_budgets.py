@@ -0,0 +1,215 @@
+"""
+    Проверка SQL запросов, которые выполняет каждый эндпоинт.
+
+    Тесты создают временную SQLite базу, заполняют ее пользователями, заметками и архивом,
+    вызывают эндпоинты через тестовый клиент Flask и записывают все выполненные запросы
+    через события движка SQLAlchemy. Для каждого сценария проверяется, что число запросов
+    не превышает бюджет, а EXPLAIN QUERY PLAN ни одного SELECT не сканирует таблицу.
+    Обход индекса (SCAN ... USING INDEX) разрешен только сценариям без фильтров, где
+    упорядоченный проход по всей таблице и есть цель запроса.
+
+    При ошибке в сообщение теста выводится SQL, который превысил бюджет или привел к сканированию.
+"""
+import datetime
+import re
+import tempfile
+import threading
+
+import pytest
+from sqlalchemy import event, text
+from werkzeug.security import generate_password_hash
+
+SEED_USERS = 200
+SEED_HOT_NOTES_PER_USER = 20
+SEED_ARCHIVED_NOTES_PER_USER = 20
+AUDIT_USERNAME = 'auditor'
+AUDIT_PASSWORD = 'Audit0r!pass'
+
+SCAN = re.compile(r'^SCAN ')
+INDEX_SCAN = re.compile(r'^SCAN (?:TABLE )?\w+ USING (?:COVERING )?INDEX ')
+TEMP_SORT = re.compile(r'USE TEMP B-TREE FOR ORDER BY')
+
+# name, url, тело запроса, нужна ли авторизация, ожидаемый код, бюджет запросов, разрешен ли обход индекса.
+# Тела, зависящие от данных, заполняются в фикстуре audit по плейсхолдерам.
+SCENARIOS = [
+    # Идет до регистрации: после нее версия 'users' меняется, и первый промах пересобирает фильтр.
+    ('login_unknown_user', '/login', {'username': 'nobody_here', 'password': AUDIT_PASSWORD}, False, 404, 0, False),
+    ('register', '/register', {'username': 'newcomer', 'password': AUDIT_PASSWORD}, False, 201, 1, False),
+    ('login', '/login', {'username': AUDIT_USERNAME, 'password': AUDIT_PASSWORD}, False, 200, 1, False),
+    ('create_note', '/create_note', {'title': 'audit', 'text': 'audit text'}, True, 201, 1, False),
+    ('edit_note', '/edit_note', {'note_id': 'hot_0', 'new_title': 'edited', 'new_text': 'edited text'},
+     True, 201, 2, False),
+    ('delete_note', '/delete_note', {'note_id': 'hot_1'}, True, 201, 2, False),
+    ('delete_archived_note', '/delete_note', {'note_id': 'archived_0'}, True, 201, 3, False),
+    ('get_note', '/get_note', {'note_id': 'hot_2'}, True, 200, 1, False),
+    ('get_archived_note', '/get_note', {'note_id': 'archived_1'}, True, 200, 2, False),
+    ('show_notes', '/show_notes', {'page': 1, 'per_page': 10}, True, 201, 3, True),
+    ('show_notes_by_user', '/show_notes', {'page': 1, 'per_page': 10, 'user_id': 'audit_user'},
+     True, 201, 3, False),
+    ('show_notes_by_date_and_user', '/show_notes',
+     {'page': 1, 'per_page': 10, 'start_date': '2000.01.01', 'user_id': 'audit_user'}, True, 201, 3, False),
+    ('show_notes_by_recent_dates', '/show_notes',
+     {'page': 1, 'per_page': 10, 'start_date': 'week_ago', 'end_date': 'today'}, True, 201, 3, False),
+    ('show_notes_by_recent_dates_and_user', '/show_notes',
+     {'page': 1, 'per_page': 10, 'start_date': 'week_ago', 'end_date': 'today', 'user_id': 'audit_user'},
+     True, 201, 3, False),
+    ('show_notes_archive_page', '/show_notes', {'page': 'archive_page', 'per_page': 10}, True, 201, 4, True),
+]
+
+
+class StatementRecorder:
+    """
+        Контекстный менеджер, записывающий SQL запросы движка, выполненные в текущем потоке.
+        Запросы фонового архиватора и других потоков в запись не попадают.
+        """
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.statements = []
+        self.__thread_id = None
+
+    def __enter__(self):
+        self.__thread_id = threading.get_ident()
+        event.listen(self.engine, 'before_cursor_execute', self.__record)
+        return self
+
+    def __exit__(self, *exc_info):
+        event.remove(self.engine, 'before_cursor_execute', self.__record)
+
+    def __record(self, conn, cursor, statement, parameters, context, executemany):
+        if threading.get_ident() == self.__thread_id:
+            self.statements.append((statement, parameters))
+
+
+def explain_query_plan(engine, statement, parameters):
+    with engine.connect() as conn:
+        rows = conn.exec_driver_sql('EXPLAIN QUERY PLAN ' + statement, parameters).fetchall()
+    return [row[-1] for row in rows]
+
+
+def find_plan_problems(plan, allow_index_scan):
+    problems = []
+    for line in plan:
+        if TEMP_SORT.search(line):
+            problems.append(line)
+        elif SCAN.match(line) and not (allow_index_scan and INDEX_SCAN.match(line)):
+            problems.append(line)
+    return problems
+
+
+def seed(session):
+    from data.db.users import User
+    from data.db.notes import Note
+    from data.db.archived_notes import ArchivedNote
+
+    now = datetime.datetime.now()
+    password_hash = generate_password_hash(AUDIT_PASSWORD, method='pbkdf2:sha256')
+    session.add_all([User(username=f'user_{i:04d}', password_hash=password_hash) for i in range(SEED_USERS)])
+    session.add(User(username=AUDIT_USERNAME, password_hash=password_hash))
+    session.commit()
+
+    note_id = 0
+    for user_id in range(1, SEED_USERS + 2):
+        for i in range(SEED_ARCHIVED_NOTES_PER_USER):
+            note_id += 1
+            created = now - datetime.timedelta(days=60 + i, minutes=user_id)
+            session.add(ArchivedNote(id=note_id, title=f'archived {note_id}', text=f'old text {note_id}',
+                                     user_id=user_id, created_date=created, updated_date=created))
+    session.commit()
+
+    # Все архивные заметки старше горячих, но их id меньше: так id горячих не пересекаются с архивом.
+    session.execute(text("INSERT INTO sqlite_sequence (name, seq) VALUES ('notes', :seq)"), {'seq': note_id})
+    for user_id in range(1, SEED_USERS + 2):
+        for i in range(SEED_HOT_NOTES_PER_USER):
+            created = now - datetime.timedelta(days=2 + i % 20, minutes=user_id)
+            session.add(Note(title=f'note {user_id} {i}', text=f'text {user_id} {i}' * 20, user_id=user_id,
+                             created_date=created, updated_date=created))
+    session.commit()
+
+
+@pytest.fixture(scope='module')
+def audit(tmp_path_factory):
+    from data.db.db_session import global_init, create_session
+
+    global_init(f"sqlite:///{tmp_path_factory.mktemp('audit') / 'audit.db'}")
+    session = create_session()
+    seed(session)
+
+    import app as notes_app
+    from data.admission import AdmissionController
+    from data.cache.server import serve_in_background
+    from data.cache.versioned import init_cache
+    from data.db.username_filter import init_username_filter
+    from data.db.users import User
+    from data.db.notes import Note
+    from data.db.archived_notes import ArchivedNote
+
+    # Лимиты допуска к этой проверке не относятся.
+    notes_app.admission = AdmissionController(limits={}, default_limits={
+        'max_concurrency': 1000, 'max_queue': 1000, 'timeout': 10, 'priority': 0, 'rate': 1000, 'burst': 1000
+    })
+    # Промаху Bloom фильтра верят только при общем кэше, как у приложения в нескольких воркерах.
+    # Путь Unix сокета ограничен ~100 символами, поэтому каталог берется короткий.
+    socket_path = f"{tempfile.mkdtemp(prefix='audit')}/cache.sock"
+    cache_server = serve_in_background(socket_path)
+    init_cache('local', socket_path)
+    init_username_filter(session)
+    client = notes_app.app.test_client()
+    token = client.post('/login', json={'username': AUDIT_USERNAME, 'password': AUDIT_PASSWORD}).json['token']
+
+    audit_user_id = session.query(User.id).filter_by(username=AUDIT_USERNAME).scalar()
+    hot_ids = [row.id for row in session.query(Note.id).filter_by(user_id=audit_user_id).order_by(Note.id).limit(3)]
+    archived_ids = [row.id for row in
+                    session.query(ArchivedNote.id).filter_by(user_id=audit_user_id).order_by(ArchivedNote.id).limit(2)]
+    placeholders = {
+        'audit_user': audit_user_id,
+        'archive_page': session.query(Note).count() // 10 + 1,
+        # Даты в том же году, что и заметки в базе: строковое сравнение с DATETIME на них ломается.
+        'week_ago': (datetime.datetime.now() - datetime.timedelta(days=7)).strftime('%Y.%m.%d'),
+        'today': datetime.datetime.now().strftime('%Y.%m.%d'),
+        **{f'hot_{i}': note_id for i, note_id in enumerate(hot_ids)},
+        **{f'archived_{i}': note_id for i, note_id in enumerate(archived_ids)},
+    }
+    # Запись пользователя кэшируется при первом запросе с токеном, и бюджеты ниже считают
+    # запросы самих эндпоинтов уже с прогретым кэшем.
+    from data.db.func import get_user
+    get_user(session, audit_user_id)
+    engine = session.get_bind()
+    session.close()
+
+    yield {'client': client, 'engine': engine, 'auth': {'Authorization': token}, 'placeholders': placeholders,
+           'socket_path': socket_path}
+
+    cache_server.shutdown()
+    cache_server.server_close()
+
+
+@pytest.mark.parametrize('name, url, payload, needs_auth, expected_status, budget, allow_index_scan',
+                         SCENARIOS, ids=[scenario[0] for scenario in SCENARIOS])
+def test_statement_budget_and_plans(audit, name, url, payload, needs_auth, expected_status, budget,
+                                    allow_index_scan):
+    from data.cache.versioned import init_cache
+
+    payload = {key: audit['placeholders'].get(value, value) if isinstance(value, str) else value
+               for key, value in payload.items()}
+    # Новые версии страниц на каждый сценарий, чтобы считать запросы к базе, а не попадания в кэш.
+    init_cache('local', audit['socket_path']).invalidate('notes')
+    with StatementRecorder(audit['engine']) as recorder:
+        response = audit['client'].post(url, json=payload, headers=audit['auth'] if needs_auth else None)
+        response.get_data()
+
+    assert response.status_code == expected_status, response.get_data(as_text=True)[:200]
+
+    statements = '\n'.join(f'    {statement} {parameters}' for statement, parameters in recorder.statements)
+    assert len(recorder.statements) <= budget, \
+        f'{len(recorder.statements)} statements, budget is {budget}:\n{statements}'
+
+    problems = []
+    for statement, parameters in recorder.statements:
+        if not statement.lstrip().upper().startswith('SELECT'):
+            continue
+        plan_problems = find_plan_problems(explain_query_plan(audit['engine'], statement, parameters),
+                                           allow_index_scan)
+        if plan_problems:
+            problems.append(f'{statement} {parameters}:\n' + '\n'.join(f'    {line}' for line in plan_problems))
+    assert not problems, 'table scan in:\n' + '\n'.join(problems)